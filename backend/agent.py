@@ -1,359 +1,569 @@
-import os
-import re
-from typing import List, Dict
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings, ChatOllama
-
-# Paths
-DB_PATH = os.path.join(os.path.dirname(__file__), "../data/vector_db")
-
-# Initialize embeddings and vectorstore
-embeddings = OllamaEmbeddings(model="nomic-embed-text")
-vectorstore = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
-
-# Initialize LLM
-llm = ChatOllama(model="gemma3", temperature=0)
-
-# ==================== IMPROVED QUERY EXPANSION ====================
-def expand_query(original_query: str) -> List[str]:
-    """
-    Generate multiple search queries with focus on faculty/staff information.
-    """
-    queries = [original_query]
-    query_lower = original_query.lower()
-    
-    # For faculty/chairperson/dean queries - CRITICAL for your issue
-    if any(word in query_lower for word in ["chairperson", "chair person", "head of department", "hod", "dean", "faculty", "professor", "lecturer"]):
-        # Add specific variations
-        queries.append(f"faculty list {original_query}")
-        queries.append(f"staff members {original_query}")
-        
-        # Extract department name
-        for dept in ["mathematics", "computer science", "electrical", "mechanical", "civil", 
-                     "chemical", "industrial", "architecture", "city planning", "regional planning"]:
-            if dept in query_lower:
-                queries.append(f"{dept} department faculty")
-                queries.append(f"{dept} chairperson head")
-                break
-    
-    # For department program queries
-    if any(word in query_lower for word in ["m.sc", "msc", "phd", "bachelor", "master", "program", "degree"]):
-        queries.append(f"program offered by department {original_query}")
-        
-        # Extract program name
-        for program in ["artificial intelligence", "ai", "mining engineering", "transportation", 
-                       "geological engineering", "geotechnical"]:
-            if program in query_lower:
-                queries.append(f"{program} program department")
-                break
-    
-    # For admission queries
-    if any(word in query_lower for word in ["admission", "apply", "eligibility", "requirement"]):
-        queries.append(f"admission requirements {original_query}")
-        queries.append(f"eligibility criteria {original_query}")
-    
-    # For transportation engineering - specific fix
-    if "transportation" in query_lower:
-        queries.append("civil engineering transportation")
-        queries.append("transportation engineering department")
-    
-    # For geological vs geotechnical
-    if "geological" in query_lower or "geotechnical" in query_lower:
-        queries.append("mining geological engineering")
-        queries.append("civil geotechnical engineering")
-    
-    # Return unique queries, max 4
-    return list(dict.fromkeys(queries))[:4]
-
-# ==================== ENHANCED RETRIEVAL WITH RERANKING ====================
-def search_prospectus(query: str) -> Dict:
-    """
-    Enhanced search with better relevance scoring.
-    """
-    print(f"   ⚡ Searching: '{query}'...")
-    
-    try:
-        # Step 1: Expand query
-        queries = expand_query(query)
-        print(f"   🔍 Expanded to {len(queries)} queries: {queries}")
-        
-        # Step 2: Retrieve documents
-        all_docs = []
-        seen_content = set()
-        
-        for q in queries:
-            # Use MMR for diversity
-            retriever = vectorstore.as_retriever(
-                search_type="mmr",
-                search_kwargs={
-                    "k": 4,  # Get 4 per query
-                    "fetch_k": 15,  # Consider 15 candidates
-                    "lambda_mult": 0.5  # More diversity for faculty info
-                }
-            )
-            docs = retriever.invoke(q)
-            
-            # Deduplicate
-            for doc in docs:
-                content_hash = hash(doc.page_content[:100])
-                if content_hash not in seen_content:
-                    seen_content.add(content_hash)
-                    all_docs.append(doc)
-        
-        if not all_docs:
-            return {
-                "found": False,
-                "context": "No relevant information found in the prospectus.",
-                "sources": []
-            }
-        
-        # Step 3: RERANK based on query keywords
-        query_lower = query.lower()
-        query_keywords = set(query_lower.split())
-        
-        scored_docs = []
-        for doc in all_docs:
-            content_lower = doc.page_content.lower()
-            
-            # Calculate relevance score
-            score = 0
-            
-            # Exact phrase match (highest priority)
-            for length in [4, 3, 2]:  # Check for 4, 3, 2 word phrases
-                words = query_lower.split()
-                for i in range(len(words) - length + 1):
-                    phrase = " ".join(words[i:i+length])
-                    if phrase in content_lower:
-                        score += length * 10  # High score for phrase matches
-            
-            # Individual keyword matches
-            doc_words = set(content_lower.split())
-            keyword_matches = query_keywords.intersection(doc_words)
-            score += len(keyword_matches) * 2
-            
-            # Boost for faculty-related terms in faculty queries
-            if any(word in query_lower for word in ["chairperson", "faculty", "head", "dean", "professor"]):
-                faculty_terms = ["dr.", "prof.", "chairperson", "head of department", "professor", "lecturer"]
-                for term in faculty_terms:
-                    if term in content_lower:
-                        score += 15  # Big boost
-            
-            # Boost for department name match
-            dept_meta = doc.metadata.get("departments", "").lower()
-            for dept_word in ["mathematics", "computer", "electrical", "civil", "mechanical", "mining"]:
-                if dept_word in query_lower and dept_word in (content_lower + " " + dept_meta):
-                    score += 10
-            
-            scored_docs.append((score, doc))
-        
-        # Sort by score and take top documents
-        scored_docs.sort(reverse=True, key=lambda x: x[0])
-        top_docs = [doc for score, doc in scored_docs[:6]]  # Top 6
-        
-        print(f"   📚 Retrieved {len(top_docs)} relevant documents")
-        print(f"   Top scores: {[score for score, _ in scored_docs[:3]]}")
-        
-        # Step 4: Build context with full content
-        context_parts = []
-        sources = []
-        
-        for i, doc in enumerate(top_docs, 1):
-            content = doc.page_content.strip()
-            dept = doc.metadata.get("departments", "General")
-            section = doc.metadata.get("section_type", "general_info")
-            page = doc.metadata.get("page", "unknown")
-            
-            context_parts.append(
-                f"[Source {i} - {dept} - Page {page}]\n{content}\n"
-            )
-            
-            sources.append({
-                "page": page,
-                "department": dept,
-                "section": section
-            })
-        
-        context = "\n".join(context_parts)
-        
-        return {
-            "found": True,
-            "context": context,
-            "sources": sources,
-            "doc_count": len(top_docs)
-        }
-        
-    except Exception as e:
-        print(f"   ❌ Search error: {str(e)}")
-        return {
-            "found": False,
-            "context": f"Search error: {str(e)}",
-            "sources": []
-        }
-
-# ==================== FIXED AGENT - ACTUALLY EXECUTES SEARCH ====================
-def run_enhanced_agent(user_query: str) -> str:
-    """
-    Fixed agent that actually executes searches instead of returning "Action: Search".
-    """
-    
-    # Check if this is clearly a UET factual question - if so, skip decision step
-    query_lower = user_query.lower()
-    
-    # Direct search triggers
-    factual_indicators = [
-        "which department", "what department", "who is", "is there", "tell me about",
-        "faculty", "chairperson", "dean", "head of department", "professor",
-        "m.sc", "msc", "phd", "bachelor", "master", "program", "offers",
-        "admission", "eligibility", "requirement", "apply",
-        "how many", "list of", "what are"
-    ]
-    
-    should_search_directly = any(indicator in query_lower for indicator in factual_indicators)
-    
-    if should_search_directly:
-        print("🎯 Direct search triggered (factual query detected)")
-        search_results = search_prospectus(user_query)
-        
-        if not search_results["found"]:
-            return "I couldn't find specific information about that in the UET prospectus. Could you rephrase your question or ask about a specific department?"
-        
-        # Generate answer with explicit instructions
-        answer_prompt = f"""You are answering a question about UET based on the official prospectus.
-
-USER QUESTION: {user_query}
-
-CONTEXT FROM PROSPECTUS:
-{search_results["context"]}
-
-CRITICAL INSTRUCTIONS:
-1. Answer the question DIRECTLY using ONLY the information in the context above.
-2. If asked about faculty, chairperson, or dean, give the EXACT names from the context.
-3. If asked about which department offers a program, state the EXACT department name from the context.
-4. Do NOT confuse different departments - pay attention to department names in the context.
-5. Be specific with names, departments, and details.
-6. If the context mentions multiple departments, make it clear which information belongs to which department.
-7. Keep your answer focused and accurate.
-
-ANSWER:"""
-
-        answer = llm.invoke(answer_prompt).content.strip()
-        return answer
-    
-    # For non-factual queries, use decision step
-    system_prompt = f"""You are the UET Prospectus AI Assistant.
-
-USER QUERY: {user_query}
-
-If this is a greeting, respond naturally.
-If this asks for UET information, output: Action: Search [your search query]
-
-Decision:"""
-
-    response = llm.invoke(system_prompt).content
-    print(f"🤖 Agent Decision: {response[:100]}...")
-    
-    # Parse for search action
-    match = re.search(r"Action:\s*Search\s*\[(.+?)\]", response, re.IGNORECASE | re.DOTALL)
-    
-    if match:
-        search_query = match.group(1).strip().strip('"').strip("'")
-        print(f"🔎 Executing search: '{search_query}'")
-        
-        search_results = search_prospectus(search_query)
-        
-        if not search_results["found"]:
-            return "I couldn't find specific information about that in the UET prospectus. Could you rephrase your question?"
-        
-        answer_prompt = f"""Based on the UET prospectus, answer this question accurately:
-
-USER QUESTION: {user_query}
-
-CONTEXT:
-{search_results["context"]}
-
-Give a direct, accurate answer using only the information provided. Be specific with names and departments.
-
-ANSWER:"""
-
-        return llm.invoke(answer_prompt).content.strip()
-    
-    # If refused, force search anyway
-    response_lower = response.lower()
-    if any(phrase in response_lower for phrase in ["don't have", "cannot", "not sure"]):
-        print("⚠️ LLM refused, forcing search...")
-        search_results = search_prospectus(user_query)
-        
-        if search_results["found"]:
-            return llm.invoke(f"Answer based on this context: {search_results['context']}\n\nQuestion: {user_query}").content.strip()
-    
-    return response
-
-# ==================== GUARDRAILS ====================
-def is_uet_related(query: str) -> bool:
-    """Enhanced guardrail."""
-    query_lower = query.lower()
-    
-    # Allow greetings
-    greetings = ["hi", "hello", "hey", "greetings", "good morning", "good evening", "thanks", "thank you"]
-    if any(query_lower.strip().startswith(g) for g in greetings) and len(query_lower.split()) <= 3:
-        return True
-    
-    # Comprehensive UET keywords
-    uet_keywords = [
-        "uet", "university of engineering", "lahore", "taxila", "faisalabad",
-        "department", "computer", "electrical", "mechanical", "civil", "chemical",
-        "industrial", "architecture", "petroleum", "biomedical", "environmental",
-        "textile", "metallurgy", "mining", "aerospace", "mathematics", "physics",
-        "transportation", "geological", "geotechnical", "city planning", "regional planning",
-        "course", "admission", "faculty", "fee", "program", "degree", "bachelor",
-        "master", "phd", "msc", "bs", "engineering", "syllabus", "curriculum",
-        "professor", "chairperson", "dean", "head of department", "hod",
-        "scholarship", "campus", "hostel", "library", "artificial intelligence",
-    ]
-    
-    return any(keyword in query_lower for keyword in uet_keywords)
-
-# ==================== MAIN ENTRY POINT ====================
-def process_query(user_query: str) -> str:
-    """Main entry point with improved handling."""
-    user_query = user_query.strip()
-    
-    if not user_query:
-        return "Please ask me a question about UET."
-    
-    if not is_uet_related(user_query):
-        return "I'm specialized in answering questions about UET departments, programs, admissions, and facilities. Please ask me about these topics!"
-    
-    try:
-        return run_enhanced_agent(user_query)
-    except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return f"I encountered an error while processing your question. Please try rephrasing."
-
-# ==================== TESTING ====================
-def test_problematic_cases():
-    """Test the specific cases that were failing."""
-    test_cases = [
-        "Can you tell me which department offers the M.Sc. Mining Engineering program?",
-        "Is there any specific department that deals with Transportation Engineering?",
-        "I am looking for the faculty list for the Department of Mathematics. Who is the Chairperson?",
-        "I want to apply for M.Sc. Artificial Intelligence. Should I select the Department of Computer Science?",
-        "I am interested in Geological Engineering. Is that the same as Geotechnical Engineering?",
-    ]
-    
-    print("\n" + "="*80)
-    print("TESTING PROBLEMATIC CASES")
-    print("="*80)
-    
-    for i, query in enumerate(test_cases, 1):
-        print(f"\n{'─'*80}")
-        print(f"Test {i}: {query}")
-        print(f"{'─'*80}")
-        response = process_query(query)
-        print(f"Response: {response}")
-        print(f"{'─'*80}")
-
-if __name__ == "__main__":
+import asyncio
+import heapq
+import logging
+import operator
+import os
+import re
+from collections import namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Tuple
+import ahocorasick
+import httpx
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+from langchain_ollama import OllamaEmbeddings, ChatOllama
+
+log = logging.getLogger(__name__)
+
+# Paths
+DB_PATH = os.path.join(os.path.dirname(__file__), "../data/vector_db")
+
+# Shared httpx settings for the Ollama clients: a pooled keep-alive
+# connection per client so repeated embed/generate requests reuse TCP
+# instead of paying a handshake each time
+OLLAMA_CLIENT_KWARGS = {
+    "limits": httpx.Limits(max_keepalive_connections=8, max_connections=8),
+}
+
+# Initialize embeddings and vectorstore (module singletons, created once)
+embeddings = OllamaEmbeddings(
+    model="nomic-embed-text",
+    client_kwargs=OLLAMA_CLIENT_KWARGS,
+)
+vectorstore = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+
+# Initialize LLM
+llm = ChatOllama(
+    model="gemma3",
+    temperature=0,
+    client_kwargs=OLLAMA_CLIENT_KWARGS,
+)
+
+# Bound concurrent generations to what the local Ollama instance can
+# actually run in parallel; excess requests queue here instead of
+# overloading the model and blowing up tail latency
+LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "2")))
+
+async def _bounded_ainvoke(prompt: str):
+    """llm.ainvoke gated by the shared concurrency semaphore."""
+    async with LLM_SEM:
+        return await llm.ainvoke(prompt)
+
+# ==================== QUERY CLASSIFICATION ====================
+# Short messages starting with these are treated as greetings
+GREETINGS = ["hi", "hello", "hey", "greetings", "good morning", "good evening", "thanks", "thank you"]
+
+# Direct search triggers
+FACTUAL_INDICATORS = [
+    "which department", "what department", "who is", "is there", "tell me about",
+    "faculty", "chairperson", "dean", "head of department", "professor",
+    "m.sc", "msc", "phd", "bachelor", "master", "program", "offers",
+    "admission", "eligibility", "requirement", "apply",
+    "how many", "list of", "what are"
+]
+
+# Comprehensive UET keywords
+UET_KEYWORDS = [
+    "uet", "university of engineering", "lahore", "taxila", "faisalabad",
+    "department", "computer", "electrical", "mechanical", "civil", "chemical",
+    "industrial", "architecture", "petroleum", "biomedical", "environmental",
+    "textile", "metallurgy", "mining", "aerospace", "mathematics", "physics",
+    "transportation", "geological", "geotechnical", "city planning", "regional planning",
+    "course", "admission", "faculty", "fee", "program", "degree", "bachelor",
+    "master", "phd", "msc", "bs", "engineering", "syllabus", "curriculum",
+    "professor", "chairperson", "dean", "head of department", "hod",
+    "scholarship", "campus", "hostel", "library", "artificial intelligence",
+]
+
+def _keyword_re(keywords) -> re.Pattern:
+    """Compile a keyword list into one alternation, longest-first."""
+    ordered = sorted(keywords, key=len, reverse=True)
+    return re.compile("|".join(re.escape(k) for k in ordered))
+
+# Precompiled keyword patterns - one C-level scan instead of a Python
+# `any(kw in text for kw in ...)` loop per call
+UET_RE = _keyword_re(UET_KEYWORDS)
+FACTUAL_RE = _keyword_re(FACTUAL_INDICATORS)
+FACULTY_RE = _keyword_re(["chairperson", "chair person", "head of department", "hod",
+                          "dean", "faculty", "professor", "lecturer"])
+PROGRAM_RE = _keyword_re(["m.sc", "msc", "phd", "bachelor", "master", "program", "degree"])
+ADMISSION_RE = _keyword_re(["admission", "apply", "eligibility", "requirement"])
+
+@dataclass(frozen=True, slots=True)
+class Query:
+    """A user query with its derived forms computed exactly once."""
+    raw: str
+    lower: str
+    tokens: Tuple[str, ...]
+
+    @classmethod
+    def of(cls, raw: str) -> "Query":
+        raw = raw.strip()
+        lower = raw.lower()
+        return cls(raw=raw, lower=lower, tokens=tuple(lower.split()))
+
+QueryClass = namedtuple("QueryClass", ["is_greeting", "is_uet", "is_factual"])
+
+@lru_cache(maxsize=2048)
+def classify_query(query_lower: str) -> QueryClass:
+    """
+    Classify a normalized (stripped, lowercased) query once; repeated
+    queries hit the cache and skip all keyword scans.
+    """
+    is_greeting = (
+        any(query_lower.startswith(g) for g in GREETINGS)
+        and len(query_lower.split()) <= 3
+    )
+    is_uet = UET_RE.search(query_lower) is not None
+    is_factual = FACTUAL_RE.search(query_lower) is not None
+    return QueryClass(is_greeting, is_uet, is_factual)
+
+# ==================== IMPROVED QUERY EXPANSION ====================
+@lru_cache(maxsize=2048)
+def expand_query(original_query: str) -> Tuple[str, ...]:
+    """
+    Generate multiple search queries with focus on faculty/staff information.
+    """
+    queries = [original_query]
+    query_lower = original_query.lower()
+    
+    # For faculty/chairperson/dean queries - CRITICAL for your issue
+    if FACULTY_RE.search(query_lower):
+        # Add specific variations
+        queries.append(f"faculty list {original_query}")
+        queries.append(f"staff members {original_query}")
+        
+        # Extract department name
+        for dept in ["mathematics", "computer science", "electrical", "mechanical", "civil", 
+                     "chemical", "industrial", "architecture", "city planning", "regional planning"]:
+            if dept in query_lower:
+                queries.append(f"{dept} department faculty")
+                queries.append(f"{dept} chairperson head")
+                break
+    
+    # For department program queries
+    if PROGRAM_RE.search(query_lower):
+        queries.append(f"program offered by department {original_query}")
+        
+        # Extract program name
+        for program in ["artificial intelligence", "ai", "mining engineering", "transportation", 
+                       "geological engineering", "geotechnical"]:
+            if program in query_lower:
+                queries.append(f"{program} program department")
+                break
+    
+    # For admission queries
+    if ADMISSION_RE.search(query_lower):
+        queries.append(f"admission requirements {original_query}")
+        queries.append(f"eligibility criteria {original_query}")
+    
+    # For transportation engineering - specific fix
+    if "transportation" in query_lower:
+        queries.append("civil engineering transportation")
+        queries.append("transportation engineering department")
+    
+    # For geological vs geotechnical
+    if "geological" in query_lower or "geotechnical" in query_lower:
+        queries.append("mining geological engineering")
+        queries.append("civil geotechnical engineering")
+    
+    # Return unique queries, max 4
+    return tuple(dict.fromkeys(queries))[:4]
+
+# ==================== ENHANCED RETRIEVAL WITH RERANKING ====================
+# Candidate-pool / MMR parameters: plain ANN fetch per expanded query,
+# then a single MMR pass over the merged pool
+POOL_K = 10  # ANN hits fetched per expanded query
+MMR_SELECT_K = 10  # diverse docs kept from the merged pool
+MMR_LAMBDA = 0.75  # relevance/diversity trade-off
+
+# Terms that boost faculty-related chunks when the query asks about people
+FACULTY_TERMS = ["dr.", "prof.", "chairperson", "head of department", "professor", "lecturer"]
+
+# Department words that earn a boost when they appear in both query and doc
+DEPT_WORDS = ["mathematics", "computer", "electrical", "civil", "mechanical", "mining"]
+
+# Faculty-flavoured queries trigger the faculty-term boost below
+RERANK_FACULTY_RE = _keyword_re(["chairperson", "faculty", "head", "dean", "professor"])
+
+# Lazily-populated cache of lowercased chunk text, keyed by chunk_id.
+# The same chunks come back for many expanded/repeated queries, so
+# lowering each one once is enough.
+_content_lower_cache: Dict[int, str] = {}
+
+def get_content_lower(doc) -> str:
+    """Return doc.page_content.lower(), cached per chunk_id."""
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id is None:
+        return doc.page_content.lower()
+    cached = _content_lower_cache.get(chunk_id)
+    if cached is None:
+        cached = _content_lower_cache[chunk_id] = doc.page_content.lower()
+    return cached
+
+def build_rerank_automaton(query: Query) -> ahocorasick.Automaton:
+    """
+    Build an Aho-Corasick automaton holding every pattern the reranker
+    scores, with its weight. One linear scan per document then replaces
+    the old nested phrase/keyword loops.
+    """
+    query_lower = query.lower
+    words = query.tokens
+
+    # Accumulate weights per pattern first: a word can be a query token
+    # AND a faculty/department term, and the contributions stack just as
+    # they did in the old per-check loops
+    weights: Dict[str, int] = {}
+
+    # Exact phrase matches (highest priority): 4, 3, 2 word phrases
+    for length in [4, 3, 2]:
+        for i in range(len(words) - length + 1):
+            phrase = " ".join(words[i:i+length])
+            weights[phrase] = weights.get(phrase, 0) + length * 10
+
+    # Individual keyword matches (once per distinct token)
+    for word in set(words):
+        weights[word] = weights.get(word, 0) + 2
+
+    # Boost for faculty-related terms in faculty queries
+    if RERANK_FACULTY_RE.search(query_lower):
+        for term in FACULTY_TERMS:
+            weights[term] = weights.get(term, 0) + 15  # Big boost
+
+    # Boost for department name match
+    for dept_word in DEPT_WORDS:
+        if dept_word in query_lower:
+            weights[dept_word] = weights.get(dept_word, 0) + 10
+
+    automaton = ahocorasick.Automaton()
+    for pattern, weight in weights.items():
+        automaton.add_word(pattern, (pattern, weight))
+    automaton.make_automaton()
+    return automaton
+
+def score_document(content_lower: str, dept_meta: str, query_lower: str,
+                   automaton: ahocorasick.Automaton) -> int:
+    """Score one document with a single automaton pass over its text."""
+    # Each pattern counts once, matching the old per-pattern scoring
+    matched = {pattern: weight for _, (pattern, weight) in automaton.iter(content_lower)}
+    score = sum(matched.values())
+
+    # Department metadata bonus (cheap post-hoc add)
+    for dept_word in DEPT_WORDS:
+        if dept_word in query_lower and dept_word not in matched and dept_word in dept_meta:
+            score += 10
+
+    return score
+
+async def search_prospectus(query: Query) -> Dict:
+    """
+    Enhanced search with better relevance scoring.
+    """
+    log.debug("   ⚡ Searching: %r...", query.raw)
+    
+    try:
+        # Step 1: Expand query
+        queries = expand_query(query.raw)
+        log.debug("   🔍 Expanded to %d queries: %s", len(queries), queries)
+        
+        # Step 2: Embed all expanded queries in ONE Ollama call,
+        # then search with the precomputed vectors (no re-embedding per query)
+        query_vectors = await embeddings.aembed_documents(list(queries))
+
+        # One batched ANN fetch for all query vectors; embeddings come back
+        # with the hits so the MMR pass below never re-embeds anything
+        results = vectorstore._collection.query(
+            query_embeddings=query_vectors,
+            n_results=POOL_K,
+            include=["documents", "metadatas", "embeddings"],
+        )
+
+        # Merge into one candidate pool, deduped by chunk_id (integer,
+        # collision-free); fall back to a content-prefix hash without one
+        candidates = []
+        candidate_vectors = []
+        seen_ids = set()
+        for texts, metas, embs in zip(results["documents"], results["metadatas"], results["embeddings"]):
+            for text, meta, emb in zip(texts, metas, embs):
+                meta = meta or {}
+                doc_key = meta.get("chunk_id")
+                if doc_key is None:
+                    doc_key = hash(text[:100])
+                if doc_key not in seen_ids:
+                    seen_ids.add(doc_key)
+                    candidates.append(Document(page_content=text, metadata=meta))
+                    candidate_vectors.append(emb)
+
+        # Single MMR pass over the merged pool, anchored on the original
+        # query's vector (greedy, so one run beats one per expanded query)
+        all_docs = []
+        if candidates:
+            mmr_indices = maximal_marginal_relevance(
+                np.array(query_vectors[0]),
+                candidate_vectors,
+                lambda_mult=MMR_LAMBDA,
+                k=MMR_SELECT_K,
+            )
+            all_docs = [candidates[i] for i in mmr_indices]
+
+        if not all_docs:
+            return {
+                "found": False,
+                "context": "No relevant information found in the prospectus.",
+                "sources": []
+            }
+        
+        # Step 3: RERANK based on query keywords (single automaton scan per doc)
+        query_lower = query.lower
+        automaton = build_rerank_automaton(query)
+
+        scored_docs = []
+        for doc in all_docs:
+            content_lower = get_content_lower(doc)
+            dept_meta = doc.metadata.get("departments", "").lower()
+            score = score_document(content_lower, dept_meta, query_lower, automaton)
+            if score > 0:  # zero-score docs never make the top anyway
+                scored_docs.append((score, doc))
+
+        # Top-k selection in C: O(N log k) instead of a full Python-keyed sort
+        top_scored = heapq.nlargest(6, scored_docs, key=operator.itemgetter(0))
+        if not top_scored:
+            # No lexical overlap at all - fall back to the MMR ordering
+            top_scored = [(0, doc) for doc in all_docs[:6]]
+        top_docs = [doc for score, doc in top_scored]
+
+        log.debug("   📚 Retrieved %d relevant documents", len(top_docs))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("   Top scores: %s", [score for score, _ in top_scored[:3]])
+        
+        # Step 4: Build context with full content
+        context_parts = []
+        sources = []
+        
+        for i, doc in enumerate(top_docs, 1):
+            content = doc.page_content.strip()
+            dept = doc.metadata.get("departments", "General")
+            section = doc.metadata.get("section_type", "general_info")
+            page = doc.metadata.get("page", "unknown")
+            
+            context_parts.append(
+                f"[Source {i} - {dept} - Page {page}]\n{content}\n"
+            )
+            
+            sources.append({
+                "page": page,
+                "department": dept,
+                "section": section
+            })
+        
+        context = "\n".join(context_parts)
+        
+        return {
+            "found": True,
+            "context": context,
+            "sources": sources,
+            "doc_count": len(top_docs)
+        }
+        
+    except Exception as e:
+        log.exception("   ❌ Search error: %s", e)
+        return {
+            "found": False,
+            "context": f"Search error: {str(e)}",
+            "sources": []
+        }
+
+# ==================== FIXED AGENT - ACTUALLY EXECUTES SEARCH ====================
+async def prepare_answer(query: Query) -> Tuple[str, str]:
+    """
+    Run search/decision and return either ("answer", final_text) when no
+    generation is needed, or ("prompt", answer_prompt) when the final
+    answer still has to come from the LLM. Both the aggregated and the
+    streaming entry points build on this.
+    """
+
+    # Check if this is clearly a UET factual question - if so, skip decision step
+    should_search_directly = classify_query(query.lower).is_factual
+
+    if should_search_directly:
+        log.info("🎯 Direct search triggered (factual query detected)")
+        search_results = await search_prospectus(query)
+
+        if not search_results["found"]:
+            return ("answer", "I couldn't find specific information about that in the UET prospectus. Could you rephrase your question or ask about a specific department?")
+
+        # Generate answer with explicit instructions
+        answer_prompt = f"""You are answering a question about UET based on the official prospectus.
+
+USER QUESTION: {query.raw}
+
+CONTEXT FROM PROSPECTUS:
+{search_results["context"]}
+
+CRITICAL INSTRUCTIONS:
+1. Answer the question DIRECTLY using ONLY the information in the context above.
+2. If asked about faculty, chairperson, or dean, give the EXACT names from the context.
+3. If asked about which department offers a program, state the EXACT department name from the context.
+4. Do NOT confuse different departments - pay attention to department names in the context.
+5. Be specific with names, departments, and details.
+6. If the context mentions multiple departments, make it clear which information belongs to which department.
+7. Keep your answer focused and accurate.
+
+ANSWER:"""
+
+        return ("prompt", answer_prompt)
+
+    # For non-factual queries, use decision step. The search runs
+    # speculatively in parallel with the decision prompt: if the decision
+    # turns out to be a greeting the results are simply discarded, otherwise
+    # we saved a full search round-trip.
+    system_prompt = f"""You are the UET Prospectus AI Assistant.
+
+USER QUERY: {query.raw}
+
+If this is a greeting, respond naturally.
+If this asks for UET information, output: Action: Search [your search query]
+
+Decision:"""
+
+    decision, search_results = await asyncio.gather(
+        _bounded_ainvoke(system_prompt),
+        search_prospectus(query)
+    )
+    response = decision.content
+    log.info("🤖 Agent Decision: %.100s...", response)
+
+    # Parse for search action
+    match = re.search(r"Action:\s*Search\s*\[(.+?)\]", response, re.IGNORECASE | re.DOTALL)
+
+    if match:
+        if not search_results["found"]:
+            return ("answer", "I couldn't find specific information about that in the UET prospectus. Could you rephrase your question?")
+
+        answer_prompt = f"""Based on the UET prospectus, answer this question accurately:
+
+USER QUESTION: {query.raw}
+
+CONTEXT:
+{search_results["context"]}
+
+Give a direct, accurate answer using only the information provided. Be specific with names and departments.
+
+ANSWER:"""
+
+        return ("prompt", answer_prompt)
+
+    # If refused, fall back to the speculative search results
+    response_lower = response.lower()
+    if any(phrase in response_lower for phrase in ["don't have", "cannot", "not sure"]):
+        log.info("⚠️ LLM refused, answering from speculative search...")
+        if search_results["found"]:
+            return ("prompt", f"Answer based on this context: {search_results['context']}\n\nQuestion: {query.raw}")
+
+    return ("answer", response)
+
+async def run_enhanced_agent(query: Query) -> str:
+    """
+    Fixed agent that actually executes searches instead of returning "Action: Search".
+    """
+    kind, payload = await prepare_answer(query)
+    if kind == "answer":
+        return payload
+    return (await _bounded_ainvoke(payload)).content.strip()
+
+# ==================== GUARDRAILS ====================
+# Bare greetings get a canned reply instead of an Ollama round-trip
+_GREETING_RE = re.compile(r"(hi|hello|hey|greetings|good (morning|afternoon|evening)|thanks|thank you)")
+
+def _canned_greeting(query_lower: str) -> str:
+    """Deterministic reply for a bare greeting - no LLM call needed."""
+    if "thank" in query_lower:
+        return "You're welcome! Feel free to ask me anything else about UET."
+    return "Hello! I'm the UET Prospectus Assistant. Ask me about UET departments, programs, admissions, fees, or facilities."
+
+def is_uet_related(query: Query) -> bool:
+    """Enhanced guardrail. Greetings are allowed through."""
+    qc = classify_query(query.lower)
+    return qc.is_greeting or qc.is_uet
+
+# ==================== MAIN ENTRY POINT ====================
+async def process_query(user_query: str) -> str:
+    """Main entry point with improved handling."""
+    query = Query.of(user_query)
+
+    if not query.raw:
+        return "Please ask me a question about UET."
+
+    # Fast path: bare greetings short-circuit before any model call
+    normalized = query.lower.strip("!? .,")
+    if _GREETING_RE.fullmatch(normalized):
+        return _canned_greeting(normalized)
+
+    if not is_uet_related(query):
+        return "I'm specialized in answering questions about UET departments, programs, admissions, and facilities. Please ask me about these topics!"
+
+    try:
+        return await run_enhanced_agent(query)
+    except Exception as e:
+        log.exception("❌ Error: %s", e)
+        return f"I encountered an error while processing your question. Please try rephrasing."
+
+async def process_query_stream(user_query: str):
+    """Streaming variant of process_query, yielding answer fragments."""
+    query = Query.of(user_query)
+
+    if not query.raw:
+        yield "Please ask me a question about UET."
+        return
+
+    # Fast path: bare greetings short-circuit before any model call
+    normalized = query.lower.strip("!? .,")
+    if _GREETING_RE.fullmatch(normalized):
+        yield _canned_greeting(normalized)
+        return
+
+    if not is_uet_related(query):
+        yield "I'm specialized in answering questions about UET departments, programs, admissions, and facilities. Please ask me about these topics!"
+        return
+
+    try:
+        kind, payload = await prepare_answer(query)
+        if kind == "answer":
+            yield payload
+            return
+        async with LLM_SEM:
+            async for chunk in llm.astream(payload):
+                if chunk.content:
+                    yield chunk.content
+    except Exception as e:
+        log.exception("❌ Error: %s", e)
+        yield "I encountered an error while processing your question. Please try rephrasing."
+
+# ==================== TESTING ====================
+def test_problematic_cases():
+    """Test the specific cases that were failing."""
+    test_cases = [
+        "Can you tell me which department offers the M.Sc. Mining Engineering program?",
+        "Is there any specific department that deals with Transportation Engineering?",
+        "I am looking for the faculty list for the Department of Mathematics. Who is the Chairperson?",
+        "I want to apply for M.Sc. Artificial Intelligence. Should I select the Department of Computer Science?",
+        "I am interested in Geological Engineering. Is that the same as Geotechnical Engineering?",
+    ]
+    
+    print("\n" + "="*80)
+    print("TESTING PROBLEMATIC CASES")
+    print("="*80)
+    
+    for i, query in enumerate(test_cases, 1):
+        print(f"\n{'─'*80}")
+        print(f"Test {i}: {query}")
+        print(f"{'─'*80}")
+        response = asyncio.run(process_query(query))
+        print(f"Response: {response}")
+        print(f"{'─'*80}")
+
+if __name__ == "__main__":
     test_problematic_cases()
\ No newline at end of file
@@ -1,146 +1,195 @@
-import os
-import re
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
-
-# Configuration
-PDF_PATH = os.path.join(os.path.dirname(__file__), "../data/UET lahore Document.pdf")
-DB_PATH = os.path.join(os.path.dirname(__file__), "../data/vector_db")
-
-# Department keywords for metadata tagging
-DEPARTMENT_KEYWORDS = {
-    "Computer Science": ["computer science", "cs department", "software", "programming", "algorithm", "data structure"],
-    "Electrical Engineering": ["electrical engineering", "ee department", "electronics", "circuits", "power systems"],
-    "Mechanical Engineering": ["mechanical engineering", "me department", "thermodynamics", "mechanics", "manufacturing"],
-    "Civil Engineering": ["civil engineering", "ce department", "structures", "construction", "surveying"],
-    "Chemical Engineering": ["chemical engineering", "chemistry", "process engineering", "chemical processes"],
-    "Industrial Engineering": ["industrial engineering", "ie department", "operations", "production"],
-    "Architecture": ["architecture", "architectural", "design studio", "building design"],
-    "Petroleum Engineering": ["petroleum", "oil", "gas", "reservoir"],
-    "Biomedical Engineering": ["biomedical", "medical devices", "biomechanics"],
-    "Environmental Engineering": ["environmental", "water treatment", "pollution"],
-    "Textile Engineering": ["textile", "fabric", "fiber"],
-    "Metallurgy": ["metallurgy", "materials science", "metals"],
-    "Mining Engineering": ["mining", "mineral extraction"],
-    "Aerospace Engineering": ["aerospace", "aeronautics", "aircraft"],
-}
-
-def extract_department_metadata(text: str) -> list:
-    """Extract department tags from text content."""
-    departments = []
-    text_lower = text.lower()
-    
-    for dept, keywords in DEPARTMENT_KEYWORDS.items():
-        if any(keyword in text_lower for keyword in keywords):
-            departments.append(dept)
-    
-    return departments if departments else ["General"]
-
-def extract_section_type(text: str) -> str:
-    """Identify what type of information this chunk contains."""
-    text_lower = text.lower()
-    
-    if any(word in text_lower for word in ["admission", "eligibility", "requirement", "criteria"]):
-        return "admissions"
-    elif any(word in text_lower for word in ["fee", "tuition", "cost", "charges"]):
-        return "fees"
-    elif any(word in text_lower for word in ["course", "syllabus", "curriculum", "semester"]):
-        return "curriculum"
-    elif any(word in text_lower for word in ["faculty", "professor", "dr.", "lecturer", "head of department"]):
-        return "faculty"
-    elif any(word in text_lower for word in ["scholarship", "financial aid", "merit"]):
-        return "financial_aid"
-    elif any(word in text_lower for word in ["hostel", "accommodation", "residence"]):
-        return "facilities"
-    else:
-        return "general_info"
-
-def clean_text(text: str) -> str:
-    """Clean and normalize text from PDF."""
-    # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text)
-    # Remove page numbers and headers/footers (common patterns)
-    text = re.sub(r'Page \d+', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'\d+\s*\n', '', text)
-    # Fix common OCR issues
-    text = text.replace('ï¬', 'fi').replace('ï¬‚', 'fl')
-    return text.strip()
-
-def ingest_data():
-    print("🚀 Starting Enhanced Data Ingestion...")
-    
-    # 1. Load PDF
-    if not os.path.exists(PDF_PATH):
-        raise FileNotFoundError(f"PDF not found at {PDF_PATH}. Please add the file.")
-    
-    loader = PyPDFLoader(PDF_PATH)
-    docs = loader.load()
-    print(f"📄 Loaded {len(docs)} pages.")
-
-    # 2. Clean documents
-    for doc in docs:
-        doc.page_content = clean_text(doc.page_content)
-    
-    # 3. Split Text with BETTER parameters
-    # Smaller chunks with more overlap for better retrieval
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,  # Smaller chunks for more precise retrieval
-        chunk_overlap=300,  # More overlap to preserve context
-        separators=["\n\n", "\n", ". ", " ", ""],  # Better splitting points
-        length_function=len,
-    )
-    splits = text_splitter.split_documents(docs)
-    print(f"✂️ Split into {len(splits)} chunks.")
-
-    # 4. Add metadata to each chunk
-    print("🏷️ Adding metadata to chunks...")
-    for i, split in enumerate(splits):
-        # Add department tags
-        departments = extract_department_metadata(split.page_content)
-        split.metadata["departments"] = ",".join(departments)
-        
-        # Add section type
-        split.metadata["section_type"] = extract_section_type(split.page_content)
-        
-        # Add chunk ID for tracking
-        split.metadata["chunk_id"] = i
-        
-        # Keep original page number
-        if "page" not in split.metadata:
-            split.metadata["page"] = "unknown"
-    
-    print(f"📊 Metadata added. Sample: {splits[0].metadata if splits else 'None'}")
-
-    # 5. Create Vector Store with improved embeddings
-    print("⏳ Generating Embeddings (this may take a moment)...")
-    embeddings = OllamaEmbeddings(model="nomic-embed-text")
-    
-    if os.path.exists(DB_PATH):
-        print("🗑️ Clearing old database...")
-        import shutil
-        shutil.rmtree(DB_PATH)
-
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory=DB_PATH,
-        collection_metadata={"hnsw:space": "cosine"}  # Better for semantic search
-    )
-    
-    print(f"💾 Vector Database saved to {DB_PATH}")
-    print(f"✅ Ingestion complete! Total chunks: {len(splits)}")
-    
-    # Print department distribution
-    dept_counts = {}
-    for split in splits:
-        for dept in split.metadata["departments"].split(","):
-            dept_counts[dept] = dept_counts.get(dept, 0) + 1
-    
-    print("\n📊 Department Distribution:")
-    for dept, count in sorted(dept_counts.items(), key=lambda x: x[1], reverse=True):
-        print(f"   {dept}: {count} chunks")
-
-if __name__ == "__main__":
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_chroma import Chroma
+from langchain_ollama import OllamaEmbeddings
+
+log = logging.getLogger(__name__)
+
+# Configuration
+PDF_PATH = os.path.join(os.path.dirname(__file__), "../data/UET lahore Document.pdf")
+DB_PATH = os.path.join(os.path.dirname(__file__), "../data/vector_db")
+EMBED_BATCH_SIZE = 64  # chunks embedded per Ollama request batch
+
+# Department keywords for metadata tagging
+DEPARTMENT_KEYWORDS = {
+    "Computer Science": ["computer science", "cs department", "software", "programming", "algorithm", "data structure"],
+    "Electrical Engineering": ["electrical engineering", "ee department", "electronics", "circuits", "power systems"],
+    "Mechanical Engineering": ["mechanical engineering", "me department", "thermodynamics", "mechanics", "manufacturing"],
+    "Civil Engineering": ["civil engineering", "ce department", "structures", "construction", "surveying"],
+    "Chemical Engineering": ["chemical engineering", "chemistry", "process engineering", "chemical processes"],
+    "Industrial Engineering": ["industrial engineering", "ie department", "operations", "production"],
+    "Architecture": ["architecture", "architectural", "design studio", "building design"],
+    "Petroleum Engineering": ["petroleum", "oil", "gas", "reservoir"],
+    "Biomedical Engineering": ["biomedical", "medical devices", "biomechanics"],
+    "Environmental Engineering": ["environmental", "water treatment", "pollution"],
+    "Textile Engineering": ["textile", "fabric", "fiber"],
+    "Metallurgy": ["metallurgy", "materials science", "metals"],
+    "Mining Engineering": ["mining", "mineral extraction"],
+    "Aerospace Engineering": ["aerospace", "aeronautics", "aircraft"],
+}
+
+def _keyword_re(keywords) -> re.Pattern:
+    """Compile a keyword list into one alternation, longest-first."""
+    ordered = sorted(keywords, key=len, reverse=True)
+    return re.compile("|".join(re.escape(k) for k in ordered))
+
+# Precompiled patterns so classification is one C-level regex scan per
+# chunk instead of a Python substring loop per keyword
+DEPT_RE = {dept: _keyword_re(keywords) for dept, keywords in DEPARTMENT_KEYWORDS.items()}
+
+SECTION_RES = [
+    (sys.intern("admissions"), _keyword_re(["admission", "eligibility", "requirement", "criteria"])),
+    (sys.intern("fees"), _keyword_re(["fee", "tuition", "cost", "charges"])),
+    (sys.intern("curriculum"), _keyword_re(["course", "syllabus", "curriculum", "semester"])),
+    (sys.intern("faculty"), _keyword_re(["faculty", "professor", "dr.", "lecturer", "head of department"])),
+    (sys.intern("financial_aid"), _keyword_re(["scholarship", "financial aid", "merit"])),
+    (sys.intern("facilities"), _keyword_re(["hostel", "accommodation", "residence"])),
+]
+GENERAL_SECTION = sys.intern("general_info")
+
+# Interned closed-set vocabulary: thousands of chunks repeat the same
+# department tags and joined tag strings, so each distinct value is kept
+# as a single shared string object
+_DEPT_TAGS = {dept: sys.intern(dept) for dept in DEPARTMENT_KEYWORDS}
+GENERAL_DEPT = sys.intern("General")
+
+def extract_department_metadata(text: str) -> list:
+    """Extract department tags from text content."""
+    text_lower = text.lower()
+    departments = [_DEPT_TAGS[dept] for dept, pattern in DEPT_RE.items() if pattern.search(text_lower)]
+    return departments if departments else [GENERAL_DEPT]
+
+def extract_section_type(text: str) -> str:
+    """Identify what type of information this chunk contains."""
+    text_lower = text.lower()
+
+    for section, pattern in SECTION_RES:
+        if pattern.search(text_lower):
+            return section
+    return GENERAL_SECTION
+
+# Single alternation covering whitespace runs, page numbers and
+# trailing line numbers, so each page is scanned once instead of three times
+_CLEAN_RE = re.compile(r'(\s+)|Page \d+|\d+\s*\n', re.IGNORECASE)
+
+def _clean_repl(match: re.Match) -> str:
+    """Collapse whitespace runs to a space, drop everything else."""
+    return ' ' if match.group(1) else ''
+
+def clean_text(text: str) -> str:
+    """Clean and normalize text from PDF."""
+    # Remove excessive whitespace, page numbers and headers/footers in one pass
+    text = _CLEAN_RE.sub(_clean_repl, text)
+    # Fix common OCR issues (multi-char sequences, so str.replace not translate)
+    text = text.replace('ï¬', 'fi').replace('ï¬‚', 'fl')
+    return text.strip()
+
+# Splitting parameters: smaller chunks with more overlap for better retrieval
+_TEXT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=800,  # Smaller chunks for more precise retrieval
+    chunk_overlap=300,  # More overlap to preserve context
+    separators=["\n\n", "\n", ". ", " ", ""],  # Better splitting points
+    length_function=len,
+)
+
+def _split_page(doc) -> list:
+    """Split one page; module-level so worker processes can pickle it."""
+    return _TEXT_SPLITTER.split_documents([doc])
+
+def ingest_data():
+    log.info("🚀 Starting Enhanced Data Ingestion...")
+    
+    # 1. Load PDF
+    if not os.path.exists(PDF_PATH):
+        raise FileNotFoundError(f"PDF not found at {PDF_PATH}. Please add the file.")
+    
+    loader = PyPDFLoader(PDF_PATH)
+    docs = loader.load()
+    log.info("📄 Loaded %d pages.", len(docs))
+
+    # 2. Clean documents
+    for doc in docs:
+        doc.page_content = clean_text(doc.page_content)
+    
+    # 3. Split Text with BETTER parameters
+    # Pages are independent, so split them across worker processes;
+    # ordering is preserved by executor.map
+    with ProcessPoolExecutor() as executor:
+        per_page_splits = executor.map(_split_page, docs, chunksize=8)
+        splits = [chunk for page_chunks in per_page_splits for chunk in page_chunks]
+    log.info("✂️ Split into %d chunks.", len(splits))
+
+    # 4. Add metadata to each chunk
+    log.info("🏷️ Adding metadata to chunks...")
+    for i, split in enumerate(splits):
+        # Add department tags (interned: repeated tag combinations share
+        # one string object across chunks)
+        departments = extract_department_metadata(split.page_content)
+        split.metadata["departments"] = sys.intern(",".join(departments))
+        
+        # Add section type
+        split.metadata["section_type"] = extract_section_type(split.page_content)
+        
+        # Add chunk ID for tracking
+        split.metadata["chunk_id"] = i
+        
+        # Keep original page number
+        if "page" not in split.metadata:
+            split.metadata["page"] = "unknown"
+    
+    log.info("📊 Metadata added. Sample: %s", splits[0].metadata if splits else None)
+
+    # 5. Create Vector Store with improved embeddings
+    log.info("⏳ Generating Embeddings (this may take a moment)...")
+    embeddings = OllamaEmbeddings(model="nomic-embed-text")
+
+    if os.path.exists(DB_PATH):
+        log.info("🗑️ Clearing old database...")
+        import shutil
+        shutil.rmtree(DB_PATH)
+
+    vectorstore = Chroma(
+        persist_directory=DB_PATH,
+        embedding_function=embeddings,
+        collection_metadata={"hnsw:space": "cosine"}  # Better for semantic search
+    )
+
+    # Embed in explicit batches (amortizes per-request overhead and keeps
+    # the embedding model saturated), then add the precomputed vectors
+    # straight to the collection
+    texts = [split.page_content for split in splits]
+    metadatas = [split.metadata for split in splits]
+    ids = [f"chunk-{i}" for i in range(len(splits))]
+
+    for start in range(0, len(splits), EMBED_BATCH_SIZE):
+        batch = slice(start, start + EMBED_BATCH_SIZE)
+        vectors = embeddings.embed_documents(texts[batch])
+        vectorstore._collection.add(
+            ids=ids[batch],
+            documents=texts[batch],
+            metadatas=metadatas[batch],
+            embeddings=vectors,
+        )
+        log.info("   📦 Embedded %d/%d chunks", min(start + EMBED_BATCH_SIZE, len(splits)), len(splits))
+
+    log.info("💾 Vector Database saved to %s", DB_PATH)
+    log.info("✅ Ingestion complete! Total chunks: %d", len(splits))
+    
+    # Print department distribution
+    dept_counts = {}
+    for split in splits:
+        for dept in split.metadata["departments"].split(","):
+            dept_counts[dept] = dept_counts.get(dept, 0) + 1
+    
+    log.info("📊 Department Distribution:")
+    for dept, count in sorted(dept_counts.items(), key=lambda x: x[1], reverse=True):
+        log.info("   %s: %d chunks", dept, count)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     ingest_data()
\ No newline at end of file
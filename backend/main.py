@@ -1,16 +1,121 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field, validator
-from agent import process_query
+from agent import process_query, process_query_stream
+import contextlib
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
 import uvicorn
 import time
 
+# Backpressure: reject new chats once this many are already in flight
+# instead of letting them pile up behind the bounded LLM semaphore
+MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "8"))
+_in_flight = 0
+
+@contextlib.contextmanager
+def _admit_request():
+    """Count a chat in flight, returning HTTP 429 when over the limit."""
+    release = _admit_stream()
+    try:
+        yield
+    finally:
+        release()
+
+def _admit_stream():
+    """
+    Atomically admit a request (raising HTTP 429 over the limit) and
+    return an idempotent release callable, so streaming responses can
+    release from whichever of generator-finally or background task runs.
+    """
+    global _in_flight
+    if _in_flight >= MAX_IN_FLIGHT:
+        raise HTTPException(status_code=429, detail="Server is busy, please retry shortly.")
+    _in_flight += 1
+    released = False
+
+    def release():
+        nonlocal released
+        global _in_flight
+        if not released:
+            released = True
+            _in_flight -= 1
+
+    return release
+
+def setup_logging():
+    """
+    Route app logging through a queue so request handlers never block on
+    stdout I/O; a background listener drains and writes the records.
+    """
+    log_queue = queue.Queue(-1)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    listener.start()
+    return listener
+
 app = FastAPI(
     title="UET AI Agent API",
     description="AI-powered assistant for UET Prospectus information",
-    version="2.0"
+    version="2.0",
+    default_response_class=ORJSONResponse,  # C-level JSON serialization
 )
 
+class GzipRequestMiddleware:
+    """
+    Transparently inflate request bodies sent with Content-Encoding: gzip,
+    so clients can compress large prompts on the wire.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = {k.lower(): v for k, v in scope.get("headers", [])}
+            if headers.get(b"content-encoding") == b"gzip":
+                body = b""
+                more_body = True
+                while more_body:
+                    message = await receive()
+                    body += message.get("body", b"")
+                    more_body = message.get("more_body", False)
+                body = gzip.decompress(body)
+
+                new_headers = [(k, v) for k, v in scope["headers"]
+                               if k.lower() not in (b"content-encoding", b"content-length")]
+                new_headers.append((b"content-length", str(len(body)).encode()))
+                scope = dict(scope, headers=new_headers)
+
+                consumed = False
+
+                async def inflated_receive():
+                    nonlocal consumed
+                    if not consumed:
+                        consumed = True
+                        return {"type": "http.request", "body": body, "more_body": False}
+                    return await receive()
+
+                await self.app(scope, inflated_receive, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(GzipRequestMiddleware)
+
+# Compress large response bodies (clients advertise gzip by default)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Add CORS middleware for web interface compatibility
 app.add_middleware(
     CORSMiddleware,
@@ -56,30 +161,33 @@ def health_check():
     }
 
 @app.post("/chat", response_model=ChatResponse)
-def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest):
     """
     Main chat endpoint for UET queries.
-    
+
     Args:
         request: ChatRequest with user message
-        
+
     Returns:
         ChatResponse with AI-generated answer
     """
     try:
-        start_time = time.time()
-        
-        # Process the query
-        response_text = process_query(request.message)
-        
-        processing_time = time.time() - start_time
-        
-        return ChatResponse(
-            response=response_text,
-            processing_time=round(processing_time, 2),
-            status="success"
-        )
-        
+        with _admit_request():
+            start_time = time.time()
+
+            # Process the query without blocking the event loop
+            response_text = await process_query(request.message)
+
+            processing_time = time.time() - start_time
+
+            return ChatResponse(
+                response=response_text,
+                processing_time=round(processing_time, 2),
+                status="success"
+            )
+
+    except HTTPException:
+        raise
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
@@ -88,7 +196,36 @@ def chat_endpoint(request: ChatRequest):
             detail=f"An error occurred while processing your request: {str(e)}"
         )
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming chat endpoint. Emits Server-Sent Events with one token
+    fragment per frame, so clients can render the answer as it is
+    generated instead of waiting for the full response.
+    """
+    # Admit before the stream starts so concurrent opens cannot slip past
+    # the limit; the generator (or the background task, if the client
+    # disconnects before it runs) releases the slot
+    release = _admit_stream()
+
+    async def event_stream():
+        try:
+            async for token in process_query_stream(request.message):
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
+
 if __name__ == "__main__":
+    setup_logging()
+
     print("🚀 Starting UET AI Agent API...")
     print("📚 Make sure you've run ingest_improved.py first!")
     print("🌐 API will be available at: http://localhost:8000")
@@ -1,290 +1,517 @@
-import streamlit as st
-import requests
-import time
-import json
-
-# Configuration
-API_URL = "http://localhost:8000/chat"
-API_HEALTH_URL = "http://localhost:8000/health"
-
-# Page config
-st.set_page_config(
-    page_title="UET AI Assistant",
-    page_icon="🎓",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Custom CSS
-st.markdown("""
-<style>
-    .main-header {
-        text-align: center;
-        padding: 20px;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border-radius: 10px;
-        margin-bottom: 30px;
-    }
-    .chat-message {
-        padding: 15px;
-        border-radius: 10px;
-        margin-bottom: 10px;
-        animation: fadeIn 0.5s;
-    }
-    .user-message {
-        background-color: #e3f2fd;
-        border-left: 4px solid #2196F3;
-    }
-    .bot-message {
-        background-color: #f3e5f5;
-        border-left: 4px solid #9c27b0;
-    }
-    .info-box {
-        padding: 15px;
-        background-color: #fff3cd;
-        border-radius: 5px;
-        border-left: 4px solid #ffc107;
-        margin: 10px 0;
-    }
-    .success-box {
-        padding: 15px;
-        background-color: #d4edda;
-        border-radius: 5px;
-        border-left: 4px solid #28a745;
-        margin: 10px 0;
-    }
-    .error-box {
-        padding: 15px;
-        background-color: #f8d7da;
-        border-radius: 5px;
-        border-left: 4px solid #dc3545;
-        margin: 10px 0;
-    }
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(10px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    .metric-card {
-        background: white;
-        padding: 15px;
-        border-radius: 10px;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        text-align: center;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# Initialize session state
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
-if 'total_queries' not in st.session_state:
-    st.session_state.total_queries = 0
-if 'avg_response_time' not in st.session_state:
-    st.session_state.avg_response_time = 0
-if 'api_status' not in st.session_state:
-    st.session_state.api_status = "Unknown"
-
-def check_api_health():
-    """Check if the API is running."""
-    try:
-        response = requests.get(API_HEALTH_URL, timeout=2)
-        if response.status_code == 200:
-            return "✅ Online"
-        return "⚠️ Degraded"
-    except:
-        return "❌ Offline"
-
-def send_message(message: str):
-    """Send message to the API and get response."""
-    try:
-        start_time = time.time()
-        response = requests.post(
-            API_URL,
-            json={"message": message},
-            timeout= 180
-        )
-        elapsed = time.time() - start_time
-        
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                "success": True,
-                "response": data.get("response", "No response received"),
-                "processing_time": data.get("processing_time", elapsed)
-            }
-        else:
-            return {
-                "success": False,
-                "response": f"Error: {response.status_code} - {response.text}",
-                "processing_time": elapsed
-            }
-    except requests.exceptions.Timeout:
-        return {
-            "success": False,
-            "response": "Request timed out. The server might be processing a complex query.",
-            "processing_time": 30
-        }
-    except requests.exceptions.ConnectionError:
-        return {
-            "success": False,
-            "response": "Cannot connect to the API. Make sure the server is running on localhost:8000",
-            "processing_time": 0
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "response": f"Error: {str(e)}",
-            "processing_time": 0
-        }
-
-# Header
-st.markdown("""
-<div class="main-header">
-    <h1>🎓 UET AI Assistant</h1>
-    <p>Your intelligent guide to UET programs, admissions, and facilities</p>
-</div>
-""", unsafe_allow_html=True)
-
-# Sidebar
-with st.sidebar:
-    st.header("ℹ️ About")
-    st.markdown("""
-    This AI assistant helps you find information about:
-    - 📚 Department programs & courses
-    - 📝 Admission requirements
-    - 👨‍🏫 Faculty information
-    """)
-    
-    st.divider()
-    
-    # API Status
-    st.header("🔧 System Status")
-    if st.button("Check API Status", use_container_width=True):
-        st.session_state.api_status = check_api_health()
-    
-    status_color = "green" if "✅" in st.session_state.api_status else "red" if "❌" in st.session_state.api_status else "orange"
-    st.markdown(f"**API Status:** :{status_color}[{st.session_state.api_status}]")
-    
-    st.divider()
-    
-    # Statistics
-    st.header("📊 Statistics")
-    col1, col2 = st.columns(2)
-    with col1:
-        st.metric("Queries", st.session_state.total_queries)
-    with col2:
-        st.metric("Avg Time", f"{st.session_state.avg_response_time:.2f}s")
-    
-    st.divider()
-    
-    # Sample questions
-    st.header("💡 Sample Questions")
-    sample_questions = [
-        "What is the admission criteria for Computer Science?",
-        "Who is the current Dean of the Faculty of Mechanical Engineering?",
-        "I have completed my 16 years of education in Computer Science. Am I eligible to apply for the M.Sc. Data Science program?",
-        "I see a program called M.Sc. Disaster Management and another called M.Sc. Disaster Mitigation Engineering. Which one is offered by the Civil Engineering department?",
-        "I heard the Department of Petroleum & Gas Engineering is highly ranked. Is there any mention of their world ranking in the prospectus?",
-        "I am looking for the faculty list for the Department of Mathematics. Who is the Chairperson?"
-    ]
-    
-    for question in sample_questions:
-        if st.button(question, key=question, use_container_width=True):
-            st.session_state.user_input = question
-    
-    st.divider()
-    
-    # Clear chat
-    if st.button("🗑️ Clear Chat History", use_container_width=True):
-        st.session_state.messages = []
-        st.rerun()
-
-# Main chat area
-st.header("💬 Chat")
-
-# Display welcome message if no messages
-if not st.session_state.messages:
-    st.markdown("""
-    <div class="info-box">
-        <strong>👋 Welcome!</strong><br>
-        Ask me anything about UET departments, admissions, courses, fees, or facilities.<br>
-        Try using the sample questions in the sidebar to get started!
-    </div>
-    """, unsafe_allow_html=True)
-
-# Display chat messages
-chat_container = st.container()
-with chat_container:
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(f"""
-            <div class="chat-message user-message">
-                <strong>👤 You:</strong><br>
-                {message["content"]}
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            processing_time = message.get("processing_time", 0)
-            st.markdown(f"""
-            <div class="chat-message bot-message">
-                <strong>🤖 UET Assistant</strong> <small>({processing_time:.2f}s)</small><br>
-                {message["content"]}
-            </div>
-            """, unsafe_allow_html=True)
-
-# Chat input
-user_input = st.chat_input("Ask me about UET...", key="chat_input")
-
-# Handle input from sample questions
-if hasattr(st.session_state, 'user_input') and st.session_state.user_input:
-    user_input = st.session_state.user_input
-    delattr(st.session_state, 'user_input')
-
-if user_input:
-    # Add user message
-    st.session_state.messages.append({
-        "role": "user",
-        "content": user_input
-    })
-    
-    # Show thinking indicator
-    with st.spinner("🤔 Thinking..."):
-        result = send_message(user_input)
-    
-    # Update statistics
-    st.session_state.total_queries += 1
-    if result.get("processing_time", 0) > 0:
-        # Calculate running average
-        old_avg = st.session_state.avg_response_time
-        n = st.session_state.total_queries
-        new_time = result["processing_time"]
-        st.session_state.avg_response_time = ((old_avg * (n - 1)) + new_time) / n
-    
-    # Add bot response
-    if result["success"]:
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": result["response"],
-            "processing_time": result["processing_time"]
-        })
-    else:
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": f"❌ {result['response']}",
-            "processing_time": result["processing_time"]
-        })
-    
-    # Rerun to update chat
-    st.rerun()
-
-# Footer
-st.divider()
-st.markdown("""
-<div style="text-align: center; color: gray; padding: 20px;">
-    <small>
-        🎓 UET AI Assistant | Powered by RAG & LLM Technology<br>
-        For the most accurate information, please verify with official UET sources.
-    </small>
-</div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+import streamlit as st
+import asyncio
+from dataclasses import dataclass
+from string import Template
+import httpx
+import queue
+import threading
+import gzip
+import html
+import time
+import json
+
+# Sample questions (module tuple: not reallocated on every rerun)
+SAMPLE_QUESTIONS = (
+    "What is the admission criteria for Computer Science?",
+    "Who is the current Dean of the Faculty of Mechanical Engineering?",
+    "I have completed my 16 years of education in Computer Science. Am I eligible to apply for the M.Sc. Data Science program?",
+    "I see a program called M.Sc. Disaster Management and another called M.Sc. Disaster Mitigation Engineering. Which one is offered by the Civil Engineering department?",
+    "I heard the Department of Petroleum & Gas Engineering is highly ranked. Is there any mention of their world ranking in the prospectus?",
+    "I am looking for the faculty list for the Department of Mathematics. Who is the Chairperson?"
+)
+
+# Configuration
+@dataclass(frozen=True)
+class AppConfig:
+    """Backend endpoints, resolved once at import."""
+    chat_url: str = "http://localhost:8000/chat"
+    stream_url: str = "http://localhost:8000/chat/stream"
+    health_url: str = "http://localhost:8000/health"
+
+CONFIG = AppConfig()
+
+# Session-state defaults, populated in one pass per rerun (callables are
+# invoked so mutable defaults are never shared between sessions)
+_SESSION_DEFAULTS = {
+    "messages": list,
+    "total_queries": 0,
+    "avg_response_time": 0.0,
+    "api_status": "Unknown",
+    "_rt_sum": 0.0,
+}
+
+def _init_session():
+    """Bulk-populate missing session-state keys."""
+    for key, value in _SESSION_DEFAULTS.items():
+        if key not in st.session_state:
+            st.session_state[key] = value() if callable(value) else value
+
+@st.cache_resource
+def _get_client() -> httpx.Client:
+    """
+    One persistent httpx client shared by every user session in the
+    process. HTTP/2 multiplexes health probes and chat posts over a
+    single connection when the backend supports it, and the pool falls
+    back to keep-alive HTTP/1.1 otherwise.
+    """
+    return httpx.Client(
+        timeout=httpx.Timeout(connect=5, read=180, write=10, pool=5),
+        transport=httpx.HTTPTransport(
+            http2=True,
+            retries=2,
+            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
+        ),
+    )
+
+# Page config
+st.set_page_config(
+    page_title="UET AI Assistant",
+    page_icon="🎓",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# Custom CSS (module constant: parsed once, injected once per session)
+_CSS = """
+<style>
+    .main-header {
+        text-align: center;
+        padding: 20px;
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        color: white;
+        border-radius: 10px;
+        margin-bottom: 30px;
+    }
+    .info-box {
+        padding: 15px;
+        background-color: #fff3cd;
+        border-radius: 5px;
+        border-left: 4px solid #ffc107;
+        margin: 10px 0;
+    }
+    .success-box {
+        padding: 15px;
+        background-color: #d4edda;
+        border-radius: 5px;
+        border-left: 4px solid #28a745;
+        margin: 10px 0;
+    }
+    .error-box {
+        padding: 15px;
+        background-color: #f8d7da;
+        border-radius: 5px;
+        border-left: 4px solid #dc3545;
+        margin: 10px 0;
+    }
+    .metric-card {
+        background: white;
+        padding: 15px;
+        border-radius: 10px;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        text-align: center;
+    }
+</style>
+"""
+
+# Static footer markup, built once at import
+_FOOTER = """
+<hr style="margin: 1em 0; border: none; border-top: 1px solid rgba(49, 51, 63, 0.2);">
+<div style="text-align: center; color: gray; padding: 20px;">
+    <small>
+        🎓 UET AI Assistant | Powered by RAG &amp; LLM Technology<br>
+        For the most accurate information, please verify with official UET sources.
+    </small>
+</div>
+"""
+
+# Emit the precompiled CSS via st.html - elements skipped on a rerun are
+# removed from the page, so this must run every pass; st.html avoids the
+# markdown parse/sanitize cost that st.markdown would pay each time
+st.html(_CSS)
+
+# Initialize session state
+_init_session()
+
+@st.cache_data(ttl=5, show_spinner=False)
+def check_api_health():
+    """Check if the API is running. Probes at most once per 5 seconds."""
+    try:
+        response = _get_client().get(CONFIG.health_url, timeout=2)
+        if response.status_code == 200:
+            return "✅ Online"
+        return "⚠️ Degraded"
+    except httpx.TransportError:
+        return "❌ Offline"
+
+# Circuit breaker: after two consecutive connect failures, stop touching
+# the socket for 10 seconds instead of paying the connect timeout on
+# every retry during an outage
+_CIRCUIT_FAILURES = 2
+_CIRCUIT_COOLDOWN = 10  # seconds
+
+def _circuit_open() -> bool:
+    """True while the backend is considered down."""
+    return time.monotonic() < st.session_state.get("_api_down_until", 0)
+
+def _record_connect_failure():
+    fails = st.session_state.get("_connect_fails", 0) + 1
+    st.session_state._connect_fails = fails
+    if fails >= _CIRCUIT_FAILURES:
+        st.session_state._api_down_until = time.monotonic() + _CIRCUIT_COOLDOWN
+
+def _record_connect_success():
+    st.session_state._connect_fails = 0
+
+def _request_stop():
+    """Stop-button callback: cancel whichever stream is in flight."""
+    cancel_event = st.session_state.get("_cancel_event")
+    if cancel_event is not None:
+        cancel_event.set()
+
+_CIRCUIT_OPEN_MSG = "Cannot connect to the API. Make sure the server is running on localhost:8000"
+
+# Compress request bodies past this size; responses are gzip-negotiated
+# automatically by httpx via Accept-Encoding
+_GZIP_THRESHOLD = 1024  # bytes
+
+def _encode_body(message: str):
+    """JSON-encode the payload, gzipping it when large enough to matter."""
+    raw = json.dumps({"message": message}).encode()
+    if len(raw) >= _GZIP_THRESHOLD:
+        return gzip.compress(raw), {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    return raw, {"Content-Type": "application/json"}
+
+def send_message(message: str):
+    """Send message to the API and get response."""
+    if _circuit_open():
+        return {"success": False, "response": _CIRCUIT_OPEN_MSG, "processing_time": 0}
+
+    try:
+        start_time = time.time()
+        body, headers = _encode_body(message)
+        response = _get_client().post(
+            CONFIG.chat_url,
+            content=body,
+            headers=headers,
+            timeout=180
+        )
+        elapsed = time.time() - start_time
+        _record_connect_success()
+
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                "success": True,
+                "response": data.get("response", "No response received"),
+                "processing_time": data.get("processing_time", elapsed)
+            }
+        else:
+            return {
+                "success": False,
+                "response": f"Error: {response.status_code} - {response.text}",
+                "processing_time": elapsed
+            }
+    except httpx.TimeoutException:
+        return {
+            "success": False,
+            "response": "Request timed out. The server might be processing a complex query.",
+            "processing_time": 30
+        }
+    except httpx.ConnectError:
+        _record_connect_failure()
+        return {
+            "success": False,
+            "response": _CIRCUIT_OPEN_MSG,
+            "processing_time": 0
+        }
+    except httpx.HTTPError as e:
+        return {
+            "success": False,
+            "response": f"Error: {str(e)}",
+            "processing_time": 0
+        }
+
+@st.cache_resource
+def _get_stream_runner():
+    """
+    A daemon event-loop thread plus a shared httpx.AsyncClient. Streaming
+    requests run on this loop instead of blocking the Streamlit script
+    thread, and the client keeps its connections alive across messages.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True, name="http-stream-loop").start()
+
+    async def make_client():
+        return httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(connect=5, read=180, write=10, pool=5),
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=10),
+        )
+
+    client = asyncio.run_coroutine_threadsafe(make_client(), loop).result()
+    return loop, client
+
+async def _astream(client, message: str, out_queue, cancel_event):
+    """
+    Consume the SSE stream on the background loop, pushing tokens to the
+    queue; stops early (closing the response) if cancel_event is set.
+    """
+    try:
+        body, headers = _encode_body(message)
+        headers["Accept"] = "text/event-stream"
+        async with client.stream(
+            "POST",
+            CONFIG.stream_url,
+            content=body,
+            headers=headers,
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                out_queue.put(("error", f"Error: {response.status_code} - {body.decode(errors='replace')}"))
+                return
+            async for raw in response.aiter_lines():
+                if cancel_event.is_set():
+                    break
+                if not raw.startswith("data: "):
+                    continue
+                data = raw[len("data: "):]
+                if data == "[DONE]":
+                    break
+                out_queue.put(("token", json.loads(data).get("token", "")))
+    except httpx.TimeoutException:
+        out_queue.put(("error", "Request timed out. The server might be processing a complex query."))
+    except httpx.ConnectError:
+        out_queue.put(("connect_error", _CIRCUIT_OPEN_MSG))
+    except Exception as e:
+        out_queue.put(("error", f"Error: {str(e)}"))
+    finally:
+        out_queue.put(("done", None))
+
+def stream_message(message: str, placeholder, cancel_event=None):
+    """
+    Stream the answer into the placeholder. The HTTP work runs on the
+    background loop; this thread only drains the token queue and paints,
+    coalescing repaints to ~40 chars / ~80 ms.
+    """
+    # During a known outage, fail fast instead of paying the connect
+    # timeout again
+    if _circuit_open():
+        return {"success": False, "response": _CIRCUIT_OPEN_MSG, "processing_time": 0}
+
+    loop, client = _get_stream_runner()
+    cancel_event = cancel_event or threading.Event()
+    out_queue = queue.Queue()
+    start_time = time.time()
+    asyncio.run_coroutine_threadsafe(_astream(client, message, out_queue, cancel_event), loop)
+
+    full = ""
+    buf = ""
+    last_paint = time.monotonic()
+    error = None
+    connect_failed = False
+    try:
+        while True:
+            try:
+                kind, payload = out_queue.get(timeout=0.25)
+            except queue.Empty:
+                # Periodic paint keeps Streamlit's control hooks running,
+                # so a Stop click can interrupt even between tokens
+                placeholder.markdown(full + buf + "▌")
+                continue
+            if kind == "done":
+                break
+            if kind in ("error", "connect_error"):
+                error = payload
+                connect_failed = kind == "connect_error"
+                break
+            buf += payload
+            if len(buf) >= 40 or time.monotonic() - last_paint > 0.08:
+                full += buf
+                buf = ""
+                placeholder.markdown(full + "▌")
+                last_paint = time.monotonic()
+    finally:
+        # Reached normally when the stream ends (a no-op then), and when
+        # Streamlit kills this run after a Stop click or new input - in
+        # which case the consumer closes the response and frees the
+        # backend from generating a discarded answer
+        cancel_event.set()
+    full += buf
+
+    if error:
+        if connect_failed:
+            _record_connect_failure()
+        return {
+            "success": False,
+            "response": error,
+            "processing_time": 0 if connect_failed else time.time() - start_time
+        }
+    _record_connect_success()
+    placeholder.markdown(full)
+    return {
+        "success": True,
+        "response": full,
+        "processing_time": time.time() - start_time
+    }
+
+# Header
+st.markdown("""
+<div class="main-header">
+    <h1>🎓 UET AI Assistant</h1>
+    <p>Your intelligent guide to UET programs, admissions, and facilities</p>
+</div>
+""", unsafe_allow_html=True)
+
+# Sidebar
+with st.sidebar:
+    st.header("ℹ️ About")
+    st.markdown("""
+    This AI assistant helps you find information about:
+    - 📚 Department programs & courses
+    - 📝 Admission requirements
+    - 👨‍🏫 Faculty information
+    """)
+    
+    st.divider()
+    
+    # API Status
+    st.header("🔧 System Status")
+    if st.button("Check API Status", use_container_width=True):
+        st.session_state.api_status = check_api_health()
+    
+    status_color = "green" if "✅" in st.session_state.api_status else "red" if "❌" in st.session_state.api_status else "orange"
+    st.markdown(f"**API Status:** :{status_color}[{st.session_state.api_status}]")
+    
+    st.divider()
+    
+    # Statistics
+    st.header("📊 Statistics")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Queries", st.session_state.total_queries)
+    with col2:
+        st.metric("Avg Time", f"{st.session_state.avg_response_time:.2f}s")
+    
+    st.divider()
+    
+    # Sample questions, collapsed by default so their widget tree is only
+    # built when the user actually opens them. A click is handled inline
+    # later this same pass - no extra rerun.
+    pending_question = None
+    with st.expander("💡 Sample Questions"):
+        cols = st.columns(2)
+        for i, question in enumerate(SAMPLE_QUESTIONS):
+            if cols[i % 2].button(question, key=f"sq{i}", use_container_width=True):
+                pending_question = question
+    
+    st.divider()
+    
+    # Clear chat
+    if st.button("🗑️ Clear Chat History", use_container_width=True):
+        st.session_state.messages = []
+        st.rerun()
+
+# Main chat area
+st.header("💬 Chat")
+
+# Display welcome message if no messages
+if not st.session_state.messages:
+    st.markdown("""
+    <div class="info-box">
+        <strong>👋 Welcome!</strong><br>
+        Ask me anything about UET departments, admissions, courses, fees, or facilities.<br>
+        Try using the sample questions in the sidebar to get started!
+    </div>
+    """, unsafe_allow_html=True)
+
+# Templates for the archived (out-of-window) part of the transcript:
+# precompiled string.Templates (substitute runs in C, no per-message
+# template parsing) concatenated into ONE markdown element instead of
+# one Streamlit element per message. Content is escaped to stay safe
+# inside unsafe_allow_html.
+_USER_TMPL = Template('<div><strong>👤 You:</strong><br>$content</div>')
+_BOT_TMPL = Template('<div><strong>🤖 UET Assistant</strong> <small>(${time}s)</small><br>$content</div>')
+
+def _render_archive(messages: list):
+    """Render older messages as a single concatenated HTML block."""
+    parts = []
+    for message in messages:
+        if message["role"] == "user":
+            parts.append(_USER_TMPL.substitute(content=html.escape(message["content"])))
+        else:
+            parts.append(_BOT_TMPL.substitute(
+                time=f"{message.get('processing_time', 0):.2f}",
+                content=html.escape(message["content"]),
+            ))
+    st.markdown("".join(parts), unsafe_allow_html=True)
+
+def _render_message(message: dict):
+    """Render one transcript entry with Streamlit's native chat widgets."""
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        if message["role"] == "assistant" and "processing_time" in message:
+            st.caption(f"{message['processing_time']:.2f}s")
+
+# Only the most recent messages render inline on each rerun; older ones
+# sit behind a collapsed expander, whose body Streamlit doesn't build
+# until it is opened
+TRANSCRIPT_WINDOW = 20
+
+# Display chat messages
+chat_container = st.container()
+with chat_container:
+    messages = st.session_state.messages
+    if len(messages) > TRANSCRIPT_WINDOW:
+        with st.expander(f"Show earlier messages ({len(messages) - TRANSCRIPT_WINDOW})"):
+            _render_archive(messages[:-TRANSCRIPT_WINDOW])
+        messages = messages[-TRANSCRIPT_WINDOW:]
+    for message in messages:
+        _render_message(message)
+
+def handle_user_input(text: str):
+    """
+    Run one full exchange - append the user message, stream the answer,
+    update stats, record the reply - in this same script pass. The new
+    messages are rendered inline, so no st.rerun() round-trip is needed.
+    """
+    st.session_state.messages.append({"role": "user", "content": text})
+    _render_message(st.session_state.messages[-1])
+
+    # Stream the answer into a placeholder as it is generated, with a
+    # Stop button that aborts the in-flight request
+    with st.chat_message("assistant"):
+        cancel_event = threading.Event()
+        st.session_state._cancel_event = cancel_event
+        stop_slot = st.empty()
+        stop_slot.button("⏹ Stop", key="stop_generation", on_click=_request_stop)
+        placeholder = st.empty()
+        result = stream_message(text, placeholder, cancel_event)
+        stop_slot.empty()
+        st.session_state._cancel_event = None
+
+    # Update statistics: keep a running sum and divide on update -
+    # constant-time and numerically stable, unlike rescaling the average
+    st.session_state.total_queries += 1
+    if result.get("processing_time", 0) > 0:
+        st.session_state._rt_sum += result["processing_time"]
+        st.session_state.avg_response_time = st.session_state._rt_sum / st.session_state.total_queries
+
+    # Record the bot response
+    content = result["response"] if result["success"] else f"❌ {result['response']}"
+    if not result["success"]:
+        placeholder.markdown(content)
+    st.session_state.messages.append({
+        "role": "assistant",
+        "content": content,
+        "processing_time": result["processing_time"]
+    })
+
+# Chat input (a clicked sample question dispatches through the same path)
+user_input = st.chat_input("Ask me about UET...", key="chat_input") or pending_question
+
+if user_input:
+    handle_user_input(user_input)
+
+# Footer: one static st.html element (no markdown parse or sanitize pass,
+# and the divider is folded in as a plain <hr>)
+st.html(_FOOTER)
\ No newline at end of file